@@ -3,6 +3,8 @@
 # requires-python = ">=3.11"
 # dependencies = [
 #     "python-dotenv",
+#     "orjson",
+#     "msgspec",
 # ]
 # ///
 
@@ -10,19 +12,23 @@
 Stop Hook with Session Summary Generation
 
 Handles session stop events:
-- Logs stop data
-- Optionally saves transcript to chat.json (--chat)
+- Appends stop data to stop.jsonl
+- Optionally copies transcript to chat.jsonl (--chat)
 - Optionally generates session summary (--summary)
 """
 
 import argparse
 import json
+import mmap
 import os
 import sys
 import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 
 from utils.constants import ensure_session_log_dir
 
@@ -32,169 +38,308 @@ try:
 except ImportError:
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson parses bytes directly and is several times faster than stdlib json;
+# fall back to json when it isn't installed.
+_loads = orjson.loads if orjson else json.loads
+
+
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to JSON bytes, compact unless indent is requested"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class _Message(msgspec.Struct, gc=False):
+        """The few transcript fields the summary reads.
 
-def parse_transcript(transcript_path: str) -> List[Dict[str, Any]]:
-    """Parse JSONL transcript file into list of messages"""
-    messages = []
+        Decoding against this schema skips every other key without building
+        Python objects for it. get() and `in` mirror the dict interface the
+        handlers use; a null field reads the same as a missing one.
+        """
+        type: Any = None
+        role: Any = None
+        name: Any = None
+        tool: Any = None
+        content: Any = None
+        message: Any = None
+        output: Any = None
+        input: Any = None
+
+        def get(self, key: str, default: Any = None) -> Any:
+            value = getattr(self, key, None)
+            return default if value is None else value
+
+        def __contains__(self, key: str) -> bool:
+            return getattr(self, key, None) is not None
+
+
+_ERROR_RE = re.compile(r"error|failed", re.IGNORECASE)
+
+# Caps on what the summary keeps; once reached, further entries are skipped
+MAX_PROMPTS_KEPT = 50
+MAX_CMDS = 15
+MAX_ERRS = 10
+MAX_TOOLS = 50
+
+# Tools whose file_path counts as a modified file
+_MODIFY_TOOLS = frozenset(("Write", "Edit", "MultiEdit"))
+
+# Append-only log of stop events, one JSON record per line
+STOP_LOG_NAME = "stop.jsonl"
+
+
+def _read_stop_log(log_dir: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the records appended to a session's stop.jsonl"""
     try:
-        with open(transcript_path, 'r') as f:
+        with open(log_dir / STOP_LOG_NAME, 'rb') as f:
             for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        messages.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        pass
-    except Exception:
-        pass
-    return messages
+                try:
+                    yield _loads(line)
+                except ValueError:
+                    pass  # Skip blank or partially written lines
+    except FileNotFoundError:
+        return
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    """stat() a path, returning None if it doesn't exist"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
 
 
-def extract_session_info(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Extract useful information from transcript messages"""
+def parse_transcript(transcript_path: str) -> List[bytes]:
+    """Read JSONL transcript file into a list of raw (undecoded) lines"""
+    lines = []
+    try:
+        with open(transcript_path, 'rb') as f:
+            # Memory-map and split on newlines ourselves instead of going
+            # through Python's line buffering. Whitespace-only lines are
+            # left in; they fail to decode and get skipped there.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                end = len(mm)
+                while start < end:
+                    nl = mm.find(b'\n', start)
+                    if nl < 0:
+                        nl = end
+                    if nl > start:
+                        lines.append(mm[start:nl])
+                    start = nl + 1
+    except Exception:
+        # Includes ValueError from mapping an empty file
+        pass
+    return lines
+
+
+def _trunc(text: str, limit: int, suffix: str = "...") -> str:
+    """Cut text to limit characters, marking the cut with suffix"""
+    return text if len(text) <= limit else text[:limit] + suffix
+
+
+def _handle_prompt(info: Dict[str, Any], get) -> None:
+    """Record a user prompt; every prompt is counted, only the first few kept"""
+    content = get("content") or get("message") or ""
+    if isinstance(content, str) and content.strip():
+        info["prompt_count"] += 1
+        if len(info["user_prompts"]) < MAX_PROMPTS_KEPT:
+            # Truncate long prompts
+            info["user_prompts"].append(_trunc(content, 200))
+
+
+def _handle_tool(info: Dict[str, Any], get) -> None:
+    """Record a tool call along with the files and commands it touched"""
+    tool_name = get("name") or get("tool")
+    if not isinstance(tool_name, str) or not tool_name:
+        return
+    if len(info["tools_used"]) < MAX_TOOLS:
+        info["tools_used"][tool_name] = None
+
+    tool_input = get("input")
+    if not isinstance(tool_input, dict):
+        return
+    input_get = tool_input.get
+
+    # Track file operations
+    file_path = input_get("file_path") or input_get("path")
+    if file_path:
+        if tool_name in _MODIFY_TOOLS:
+            info["files_modified"][file_path] = None
+        elif tool_name == "Read":
+            info["files_read"][file_path] = None
+
+    # Track bash commands
+    if tool_name == "Bash" and len(info["commands_run"]) < MAX_CMDS:
+        command = input_get("command")
+        if command:
+            # Truncate long commands
+            info["commands_run"].append(_trunc(command, 100))
+
+
+def _handle_result(info: Dict[str, Any], get) -> None:
+    """Record a tool result whose output looks like an error"""
+    if len(info["errors_encountered"]) >= MAX_ERRS:
+        return
+    content = get("content") or get("output") or ""
+    if not isinstance(content, str):
+        content = str(content)
+    if _ERROR_RE.search(content):
+        info["errors_encountered"].append(_trunc(content, 150))
+
+
+# Message type -> handler; untyped messages fall back to role/tool markers
+_HANDLERS = {
+    "human": _handle_prompt,
+    "tool_use": _handle_tool,
+    "tool_result": _handle_result,
+}
+
+
+def extract_session_info(lines: List[bytes]) -> Dict[str, Any]:
+    """Extract useful information from raw transcript lines"""
     info = {
         "user_prompts": [],
-        "tools_used": [],
-        "files_modified": [],
+        "prompt_count": 0,
+        # Dicts used as insertion-ordered sets while collecting, so repeat
+        # touches are O(1) and first-seen order survives; listed at the end
+        "tools_used": {},
+        "files_modified": {},
         "files_created": [],
-        "files_read": [],
+        "files_read": {},
         "commands_run": [],
         "errors_encountered": [],
-        "total_messages": len(messages)
+        "total_messages": 0
     }
 
-    for msg in messages:
-        msg_type = msg.get("type", "")
-
-        # Extract user prompts
-        if msg_type == "human" or msg.get("role") == "user":
-            content = msg.get("content", msg.get("message", ""))
-            if isinstance(content, str) and content.strip():
-                # Truncate long prompts
-                prompt = content[:200] + "..." if len(content) > 200 else content
-                info["user_prompts"].append(prompt)
-
-        # Extract tool usage
-        if msg_type == "tool_use" or "tool" in msg:
-            tool_name = msg.get("name", msg.get("tool", ""))
-            if tool_name:
-                if tool_name not in info["tools_used"]:
-                    info["tools_used"].append(tool_name)
-
-                # Track file operations
-                tool_input = msg.get("input", {})
-                if isinstance(tool_input, dict):
-                    file_path = tool_input.get("file_path", tool_input.get("path", ""))
-                    if file_path:
-                        if tool_name in ["Write", "Edit", "MultiEdit"]:
-                            if file_path not in info["files_modified"]:
-                                info["files_modified"].append(file_path)
-                        elif tool_name == "Read":
-                            if file_path not in info["files_read"]:
-                                info["files_read"].append(file_path)
-
-                    # Track bash commands
-                    if tool_name == "Bash":
-                        command = tool_input.get("command", "")
-                        if command:
-                            # Truncate long commands
-                            cmd = command[:100] + "..." if len(command) > 100 else command
-                            info["commands_run"].append(cmd)
-
-        # Extract errors
-        if msg_type == "tool_result" or "error" in str(msg).lower():
-            content = str(msg.get("content", msg.get("output", "")))
-            if "error" in content.lower() or "failed" in content.lower():
-                error = content[:150] + "..." if len(content) > 150 else content
-                info["errors_encountered"].append(error)
+    if msgspec is not None:
+        # Partial schema: only the declared fields are decoded
+        decode = msgspec.json.Decoder(_Message).decode
+    else:
+        decode = _loads
+
+    handlers_get = _HANDLERS.get
+    total = 0
+    for raw in lines:
+        try:
+            msg = decode(raw)
+        except ValueError:
+            continue
+        total += 1
+
+        get = msg.get
+        # Any JSON value can sit in these fields; only strings are hashable
+        # keys we know how to dispatch on
+        mtype = get("type")
+        handler = handlers_get(mtype) if isinstance(mtype, str) else None
+        if handler is None:
+            if get("role") == "user":
+                handler = _handle_prompt
+            elif "tool" in msg:
+                handler = _handle_tool
+        if handler is not None:
+            handler(info, get)
+    info["total_messages"] = total
 
     # Deduplicate and limit
-    info["files_modified"] = list(set(info["files_modified"]))[:20]
-    info["files_read"] = list(set(info["files_read"]))[:20]
-    info["commands_run"] = info["commands_run"][:15]
-    info["errors_encountered"] = info["errors_encountered"][:10]
+    info["tools_used"] = list(info["tools_used"])
+    info["files_modified"] = list(islice(info["files_modified"], 20))
+    info["files_read"] = list(islice(info["files_read"], 20))
 
     return info
 
 
+def _section(title: str, lines: List[str]) -> str:
+    """Render one '## title' block, or nothing when it has no lines"""
+    if not lines:
+        return ""
+    return f"## {title}\n" + "\n".join(lines) + "\n\n"
+
+
+def _more(total: int, shown: int, noun: str) -> List[str]:
+    """'... and N more' trailer for `total` items cut down to the first `shown`"""
+    hidden = total - shown
+    return [f"  ... and {hidden} more {noun}"] if hidden > 0 else []
+
+
 def generate_summary(info: Dict[str, Any]) -> str:
     """Generate a human-readable session summary"""
-    summary = []
-    summary.append("=" * 60)
-    summary.append("SESSION SUMMARY")
-    summary.append("=" * 60)
-    summary.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    summary.append("")
-
-    # What was requested
-    if info["user_prompts"]:
-        summary.append("## What Was Requested")
-        for i, prompt in enumerate(info["user_prompts"][:5], 1):
-            # Clean up the prompt for display
-            clean_prompt = prompt.replace("\n", " ").strip()
-            summary.append(f"  {i}. {clean_prompt}")
-        if len(info["user_prompts"]) > 5:
-            summary.append(f"  ... and {len(info['user_prompts']) - 5} more prompts")
-        summary.append("")
-
-    # Files modified
-    if info["files_modified"]:
-        summary.append("## Files Modified")
-        for f in info["files_modified"][:10]:
-            summary.append(f"  ✏️  {f}")
-        if len(info["files_modified"]) > 10:
-            summary.append(f"  ... and {len(info['files_modified']) - 10} more files")
-        summary.append("")
-
-    # Tools used
-    if info["tools_used"]:
-        summary.append("## Tools Used")
-        summary.append(f"  {', '.join(info['tools_used'])}")
-        summary.append("")
-
-    # Commands run
-    if info["commands_run"]:
-        summary.append("## Commands Executed")
-        for cmd in info["commands_run"][:5]:
-            summary.append(f"  $ {cmd}")
-        if len(info["commands_run"]) > 5:
-            summary.append(f"  ... and {len(info['commands_run']) - 5} more commands")
-        summary.append("")
-
-    # Errors
-    if info["errors_encountered"]:
-        summary.append("## Errors Encountered")
-        for err in info["errors_encountered"][:3]:
-            summary.append(f"  ⚠️  {err[:100]}")
-        summary.append("")
-
-    # Statistics
-    summary.append("## Statistics")
-    summary.append(f"  • Total messages: {info['total_messages']}")
-    summary.append(f"  • Files modified: {len(info['files_modified'])}")
-    summary.append(f"  • Files read: {len(info['files_read'])}")
-    summary.append(f"  • Commands run: {len(info['commands_run'])}")
-    summary.append("")
-
-    summary.append("=" * 60)
-
-    return "\n".join(summary)
+    prompts = info["user_prompts"]
+    files = info["files_modified"]
+    tools = info["tools_used"]
+    commands = info["commands_run"]
+    errors = info["errors_encountered"]
+
+    # Clean up the prompts for display
+    shown_prompts = [prompt.replace("\n", " ").strip() for prompt in prompts[:5]]
+
+    prompts_block = _section("What Was Requested", [
+        f"  {i}. {prompt}" for i, prompt in enumerate(shown_prompts, 1)
+    ] + _more(info["prompt_count"], 5, "prompts"))
+    files_block = _section("Files Modified", [
+        f"  ✏️  {f}" for f in files[:10]
+    ] + _more(len(files), 10, "files"))
+    tools_block = _section("Tools Used", [f"  {', '.join(tools)}"] if tools else [])
+    commands_block = _section("Commands Executed", [
+        f"  $ {cmd}" for cmd in commands[:5]
+    ] + _more(len(commands), 5, "commands"))
+    errors_block = _section("Errors Encountered", [
+        f"  ⚠️  {_trunc(err, 100)}" for err in errors[:3]
+    ])
+
+    rule = "=" * 60
+    return (
+        f"{rule}\n"
+        f"SESSION SUMMARY\n"
+        f"{rule}\n"
+        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"\n"
+        f"{prompts_block}{files_block}{tools_block}{commands_block}{errors_block}"
+        f"## Statistics\n"
+        f"  • Total messages: {info['total_messages']}\n"
+        f"  • Files modified: {len(files)}\n"
+        f"  • Files read: {len(info['files_read'])}\n"
+        f"  • Commands run: {len(commands)}\n"
+        f"\n"
+        f"{rule}"
+    )
+
+
+def _write_files(writes: List[Tuple[Path, bytes]]):
+    """Write each (path, data) pair in turn, one write() call per file.
+
+    These are advisory logs, so nothing is fsynced.
+    """
+    for path, data in writes:
+        with open(path, 'wb') as f:
+            f.write(data)
 
 
 def save_summary(log_dir: Path, summary: str, info: Dict[str, Any]):
     """Save summary to files"""
-    # Save human-readable summary
-    summary_file = log_dir / 'session_summary.txt'
-    with open(summary_file, 'w') as f:
-        f.write(summary)
-
-    # Save structured data
-    data_file = log_dir / 'session_summary.json'
-    with open(data_file, 'w') as f:
-        json.dump({
+    _write_files([
+        # Human-readable summary
+        (log_dir / 'session_summary.txt', summary.encode()),
+        # Structured data
+        (log_dir / 'session_summary.json', _dumps({
             "generated_at": datetime.now().isoformat(),
             "info": info
-        }, f, indent=2)
+        }, indent=True)),
+    ])
 
 
 def main():
@@ -202,13 +347,13 @@ def main():
         # Parse command line arguments
         parser = argparse.ArgumentParser()
         parser.add_argument('--chat', action='store_true',
-                          help='Copy transcript to chat.json')
+                          help='Copy transcript to chat.jsonl')
         parser.add_argument('--summary', action='store_true',
                           help='Generate session summary')
         args = parser.parse_args()
 
         # Read JSON input from stdin
-        input_data = json.load(sys.stdin)
+        input_data = _loads(sys.stdin.buffer.read())
 
         # Extract required fields
         session_id = input_data.get("session_id", "unknown")
@@ -216,44 +361,47 @@ def main():
 
         # Ensure session log directory exists
         log_dir = ensure_session_log_dir(session_id)
-        log_path = log_dir / "stop.json"
-
-        # Read existing log data or initialize empty list
-        if log_path.exists():
-            with open(log_path, 'r') as f:
-                try:
-                    log_data = json.load(f)
-                except (json.JSONDecodeError, ValueError):
-                    log_data = []
-        else:
-            log_data = []
-
-        # Append new data
-        log_data.append(input_data)
-
-        # Write back to file with formatting
-        with open(log_path, 'w') as f:
-            json.dump(log_data, f, indent=2)
-
-        # Handle transcript processing
-        if transcript_path and os.path.exists(transcript_path):
-            messages = parse_transcript(transcript_path)
-
-            # Save chat.json if requested
-            if args.chat and messages:
-                chat_file = log_dir / 'chat.json'
-                with open(chat_file, 'w') as f:
-                    json.dump(messages, f, indent=2)
+        log_path = log_dir / STOP_LOG_NAME
+
+        # Append one record instead of rewriting the whole log
+        with open(log_path, 'ab') as f:
+            f.write(_dumps(input_data) + b'\n')
+
+        # Handle transcript processing, only when a flag asks for it. One
+        # stat stands in for the existence check, and empty transcripts
+        # are skipped outright.
+        transcript_stat = None
+        if (args.chat or args.summary) and transcript_path:
+            transcript_stat = _stat(transcript_path)
+        if transcript_stat is not None and transcript_stat.st_size:
+            # Save chat.jsonl if requested. This used to be chat.json, a
+            # re-encoded JSON array; it is now a byte copy of the JSONL
+            # transcript so nothing has to be decoded to produce it.
+            # The copy is pure I/O, so it runs alongside the summary.
+            chat_copy = None
+            if args.chat:
+                pool = ThreadPoolExecutor(max_workers=1)
+                chat_copy = pool.submit(
+                    shutil.copyfile, transcript_path, log_dir / 'chat.jsonl')
+                # The submitted copy still runs; this only releases the pool
+                pool.shutdown(wait=False)
 
             # Generate summary if requested
-            if args.summary and messages:
-                info = extract_session_info(messages)
+            info = None
+            if args.summary:
+                lines = parse_transcript(transcript_path)
+                if lines:
+                    info = extract_session_info(lines)
+            if info:
                 summary = generate_summary(info)
                 save_summary(log_dir, summary, info)
 
                 # Print summary to stdout so user sees it
                 print("\n" + summary)
 
+            if chat_copy is not None:
+                chat_copy.result()
+
         sys.exit(0)
 
     except json.JSONDecodeError: